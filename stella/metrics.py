@@ -53,20 +53,33 @@ class ModelMetrics(object):
         df = os.listdir(self.dir)
 
         if self.mode == 'cross_val':
-            files = np.sort([i for i in df if 'crossval' in i])
+            key = 'crossval'
             folds = []
 
         elif self.mode == 'ensemble':
-            files = np.sort([i for i in df if 'ensemble' in i])
+            key = 'ensemble'
             seeds = []
 
-        self.models  = [i for i in files if i.endswith('.h5')]
+        # SORTS THE DIRECTORY LISTING INTO MODELS & TABLES IN A SINGLE
+        # PASS INSTEAD OF RESCANNING IT ONCE PER FILE TYPE
+        models, predval, history, predtest = [], [], [], []
+        for fn in np.sort([i for i in df if key in i]):
+            if fn.endswith('.h5'):
+                models.append(fn)
+            elif 'predval' in fn:
+                predval.append(fn)
+            elif 'histories' in fn:
+                history.append(fn)
+            elif 'predtest' in fn:
+                predtest.append(fn)
 
-        predval = [i for i in files if 'predval' in i][0]
-        history = [i for i in files if 'histories' in i][0]
+        self.models = models
+
+        predval = predval[0]
+        history = history[0]
 
         try:
-            predtest = [i for i in files if 'predtest' in i][0]
+            predtest = predtest[0]
             self.predtest_table = Table.read(os.path.join(self.dir, predtest),
                                              format='ascii')
         except:
@@ -119,9 +132,7 @@ class ModelMetrics(object):
 
     def pred_round(self, table, threshold):
         """ Rounds the average prediction based on a threshold. """
-        pr = np.zeros(len(table))
-        pr[table['pred_mean'].data >= threshold] = 1
-        pr[table['pred_mean'].data <  threshold] = 0
+        pr = (table['pred_mean'].data >= threshold).astype(float)
         table.add_column(Column(pr, name='round_pred'), index=3)
         return table
 
@@ -172,14 +183,16 @@ class ModelMetrics(object):
         gt = tab['gt'].data
         
         keys = np.sort([i for i in tab.colnames if 'pred_' in i])
-        for i, val in enumerate(keys):
-            ap.append( np.round(average_precision_score(gt, tab[val].data, 
-                                                        average=None), 4))
-            arr = np.copy(tab[val].data)
-            arr[arr >= threshold] = 1.0
-            arr[arr < threshold]  = 0.0
 
-            ac.append( np.round(np.sum(arr == gt) / len(tab), 4))
+        # THRESHOLDS EVERY PREDICTION COLUMN IN ONE BROADCAST AND
+        # COMPUTES ALL OF THE ACCURACIES ROW-WISE
+        preds = np.array([tab[val].data for val in keys])
+        rounded = np.where(preds >= threshold, 1.0, 0.0)
+        ac = np.round(np.sum(rounded == gt, axis=1) / len(tab), 4)
+
+        for val in keys:
+            ap.append( np.round(average_precision_score(gt, tab[val].data,
+                                                        average=None), 4))
 
         prec, rec, _ = precision_recall_curve(gt, tab['pred_mean'].data)
 
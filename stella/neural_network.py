@@ -90,10 +90,17 @@ class ConvNN(object):
         self.output_dir = output_dir
 
 
-    def create_model(self, seed):
+    def create_model(self, seed, show_summary=True):
         """
         Creates the Tensorflow keras model with appropriate layers.
-        
+
+        Parameters
+        ----------
+        seed : int
+             Sets the random seed of the model.
+        show_summary : bool, optional
+             Prints the model summary after compiling. Default is True.
+
         Attributes
         ----------
         model : tensorflow.python.keras.engine.sequential.Sequential
@@ -102,9 +109,19 @@ class ConvNN(object):
         np.random.seed(seed)
         tf.random.set_seed(seed)
 
+        # TURNS ON XLA AUTO-CLUSTERING TO FUSE ELEMENTWISE OPS
+        tf.config.optimizer.set_jit(True)
+
         # INITIALIZE CLEAN MODEL
         keras.backend.clear_session()
 
+        # RUNS IN MIXED PRECISION ON GPUS TO USE TENSOR CORES AND HALVE
+        # ACTIVATION MEMORY; CPU-ONLY RUNS ARE LEFT IN FLOAT32
+        mixed_prec = len(tf.config.list_physical_devices('GPU')) > 0
+        if mixed_prec:
+            from tensorflow.keras import mixed_precision
+            mixed_precision.set_global_policy('mixed_float16')
+
         model = keras.models.Sequential()
 
         # DEFAULT NETWORK MODEL FROM FEINSTEIN ET AL. (in prep)
@@ -129,28 +146,46 @@ class ConvNN(object):
             model.add(tf.keras.layers.Flatten())
             model.add(tf.keras.layers.Dense(dense, activation='relu'))
             model.add(tf.keras.layers.Dropout(dropout))
-            model.add(tf.keras.layers.Dense(1, activation='sigmoid'))
+            # OUTPUT KEPT IN FLOAT32 FOR NUMERICAL STABILITY
+            model.add(tf.keras.layers.Dense(1, activation='sigmoid',
+                                            dtype='float32'))
             
         else:
             for l in self.layers:
                 model.add(l)
                 
         # COMPILE MODEL AND SET OPTIMIZER, LOSS, METRICS
+        self._compile_model(model)
+
+        self.model = model
+
+        # PRINTS MODEL SUMMARY
+        if show_summary is True:
+            model.summary()
+
+
+    def _compile_model(self, model):
+        """
+        Compiles a built model with a fresh optimizer and the class
+        loss and metrics. Recompiling an existing model resets the
+        optimizer state without rebuilding the layer graph.
+        """
+        # WRAPS OPTIMIZER WITH LOSS SCALING TO AVOID FP16 UNDERFLOW
+        optimizer = keras.optimizers.get(self.optimizer)
+        if len(tf.config.list_physical_devices('GPU')) > 0:
+            from tensorflow.keras import mixed_precision
+            optimizer = mixed_precision.LossScaleOptimizer(optimizer)
+
         if self.metrics is None:
-            model.compile(optimizer=self.optimizer,
+            model.compile(optimizer=optimizer,
                           loss=self.loss,
-                          metrics=['accuracy', tf.keras.metrics.Precision(), 
+                          metrics=['accuracy', tf.keras.metrics.Precision(),
                                    tf.keras.metrics.Recall()])
         else:
-            model.compile(optimizer=self.optimizer,
+            model.compile(optimizer=optimizer,
                           loss=self.loss,
                           metrics=self.metrics)
 
-        self.model = model
-
-        # PRINTS MODEL SUMMARY
-        model.summary()
-
 
     def load_model(self, modelname, mode='validation'):
         """
@@ -161,7 +196,7 @@ class ConvNN(object):
         modelname : str
         mode : str, optional
         """
-        model = keras.models.load_model(modelname)
+        model = keras.models.load_model(modelname, compile=False)
         self.model = model
         
         if mode == 'test':
@@ -175,7 +210,7 @@ class ConvNN(object):
         
 
     def train_models(self, seeds=[2], epochs=350, batch_size=64, shuffle=False,
-                     pred_test=False, save=False):
+                     pred_test=False, save=False, callbacks=None):
         """
         Runs n number of models with given initial random seeds of
         length n. Also saves each model run to a hidden ~/.stella 
@@ -190,7 +225,8 @@ class ConvNN(object):
              Number of epochs to train for. Default is 350.
         batch_size : int, optional
              Setting the batch size for the training. Default
-             is 64.
+             is 64. On multi-GPU machines this is the per-replica
+             batch size.
         shuffle : bool, optional
              Allows for shuffling of the training set when fitting
              the model. Default is False.
@@ -202,6 +238,11 @@ class ConvNN(object):
              Saves the predictions and histories of from each model
              in an ascii table to the specified output directory.
              Default is False.
+        callbacks : list, optional
+             List of keras callbacks passed to model.fit. Default is
+             EarlyStopping on the validation loss (patience of 50
+             epochs, restoring the best weights) and ReduceLROnPlateau
+             on the validation loss.
 
         Attributes
         ----------
@@ -219,6 +260,18 @@ class ConvNN(object):
 
         self.epochs = epochs
 
+        # STOPS TRAINING ONCE THE VALIDATION LOSS STALLS AND STEPS THE
+        # LEARNING RATE DOWN ALONG THE WAY, RATHER THAN ALWAYS PAYING
+        # FOR THE FULL NUMBER OF EPOCHS
+        if callbacks is None:
+            callbacks = [keras.callbacks.EarlyStopping(monitor='val_loss',
+                                                       patience=50,
+                                                       restore_best_weights=True),
+                         keras.callbacks.ReduceLROnPlateau(monitor='val_loss',
+                                                           factor=0.5,
+                                                           patience=20,
+                                                           min_lr=1e-5)]
+
         # CREATES TABLES FOR SAVING DATA
         table = Table()
         val_table  = Table([self.ds.val_ids, self.ds.val_labels, self.ds.val_tpeaks],
@@ -227,39 +280,74 @@ class ConvNN(object):
                            names=['tic', 'gt', 'tpeak'])
         
         
+        # DATA-PARALLELIZES EACH MODEL ACROSS ALL VISIBLE GPUS; THE
+        # GLOBAL BATCH SIZE SCALES WITH THE NUMBER OF REPLICAS
+        if len(tf.config.list_physical_devices('GPU')) > 1:
+            strategy = tf.distribute.MirroredStrategy()
+        else:
+            strategy = tf.distribute.get_strategy()
+        batch_size = batch_size * strategy.num_replicas_in_sync
+
+        # VALIDATION PIPELINE IS THE SAME FOR EVERY SEED
+        val_ds = tf.data.Dataset.from_tensor_slices((self.ds.val_data,
+                                                     self.ds.val_labels))
+        val_ds = val_ds.cache().batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
         for seed in seeds:
-            
+
             fmt_tail = '_s{0:04d}_i{1:04d}_b{2}'.format(int(seed), int(epochs), self.frac_balance)
             model_fmt = 'ensemble' + fmt_tail + '.h5'
 
             keras.backend.clear_session()
-            
-            # CREATES MODEL BASED ON GIVEN RANDOM SEED
-            self.create_model(seed)
-            self.history = self.model.fit(self.ds.train_data, self.ds.train_labels, 
-                                          epochs=epochs,
-                                          batch_size=batch_size, shuffle=shuffle,
-                                          validation_data=(self.ds.val_data, self.ds.val_labels))
 
+            # BUILDS A TF.DATA PIPELINE TO OVERLAP BATCH ASSEMBLY WITH
+            # TRAINING & AVOID RE-COPYING THE NUMPY ARRAYS EVERY EPOCH
+            train_ds = tf.data.Dataset.from_tensor_slices((self.ds.train_data,
+                                                           self.ds.train_labels))
+            train_ds = train_ds.cache()
+            if shuffle is True:
+                train_ds = train_ds.shuffle(len(self.ds.train_labels), seed=seed,
+                                            reshuffle_each_iteration=True)
+            train_ds = train_ds.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+            # CREATES MODEL BASED ON GIVEN RANDOM SEED; ONLY PRINTS
+            # THE (IDENTICAL) SUMMARY FOR THE FIRST SEED
+            with strategy.scope():
+                self.create_model(seed, show_summary=(seed == seeds[0]))
+            self.history = self.model.fit(train_ds, epochs=epochs,
+                                          validation_data=val_ds,
+                                          callbacks=callbacks)
+
+            # NAN-PADS THE HISTORIES TO THE FULL EPOCH BUDGET, SINCE
+            # SEEDS THAT EARLY-STOP AT DIFFERENT EPOCHS MUST STILL
+            # SHARE EQUAL-LENGTH COLUMNS IN THE TABLE
             col_names = list(self.history.history.keys())
             for cn in col_names:
-                col = Column(self.history.history[cn], name=cn+'_s{0:04d}'.format(int(seed)))
+                vals = np.full(epochs, np.nan)
+                vals[:len(self.history.history[cn])] = self.history.history[cn]
+                col = Column(vals, name=cn+'_s{0:04d}'.format(int(seed)))
                 table.add_column(col)
 
-            # SAVES THE MODEL TO OUTPUT DIRECTORY
-            self.model.save(os.path.join(self.output_dir, model_fmt))
-
-            # GETS PREDICTIONS FOR EACH VALIDATION SET LIGHT CURVE
-            val_preds = self.model.predict(self.ds.val_data)
-            val_preds = np.reshape(val_preds, len(val_preds))
-            val_table.add_column(Column(val_preds, name='pred_s{0:04d}'.format(int(seed))))
-            
+            # SAVES THE MODEL TO OUTPUT DIRECTORY; OPTIMIZER STATE IS
+            # NOT NEEDED FOR INFERENCE AND DOUBLES THE WRITE
+            self.model.save(os.path.join(self.output_dir, model_fmt),
+                            include_optimizer=False)
 
-            # GETS PREDICTIONS FOR EACH TEST SET LIGHT CURVE IF PRED_TEST IS TRUE
+            # GETS PREDICTIONS FOR THE VALIDATION (AND TEST) SET LIGHT
+            # CURVES IN ONE CALL, SO THE PREDICT GRAPH IS ONLY TRACED
+            # ONCE PER SEED
             if pred_test is True:
-                test_preds = self.model.predict(self.ds.test_data)
-                test_preds = np.reshape(test_preds, len(test_preds))
+                preds = self.model.predict(np.concatenate((self.ds.val_data,
+                                                           self.ds.test_data)))
+                preds = np.reshape(preds, len(preds))
+                val_preds  = preds[:len(self.ds.val_labels)]
+                test_preds = preds[len(self.ds.val_labels):]
                 test_table.add_column(Column(test_preds, name='pred_s{0:04d}'.format(int(seed))))
+            else:
+                val_preds = self.model.predict(self.ds.val_data)
+                val_preds = np.reshape(val_preds, len(val_preds))
+
+            val_table.add_column(Column(val_preds, name='pred_s{0:04d}'.format(int(seed))))
                 
         # SETS TABLE ATTRIBUTES
         self.history_table = table
@@ -273,13 +361,11 @@ class ConvNN(object):
             pred_fmt = 'ensemble_predval' + fmt_table
 
             table.write(os.path.join(self.output_dir, hist_fmt), format='ascii')
-            val_table.write(os.path.join(self.output_dir, pred_fmt), format='ascii',
-                            fast_writer=False)
+            val_table.write(os.path.join(self.output_dir, pred_fmt), format='ascii')
 
             if pred_test is True:
                 test_fmt = 'ensemble_predtest' + fmt_table
-                test_table.write(os.path.join(self.output_dir, test_fmt), format='ascii',
-                                 fast_writer=False)
+                test_table.write(os.path.join(self.output_dir, test_fmt), format='ascii')
 
 
     def cross_validation(self, seed=2, epochs=350, batch_size=64,
@@ -334,8 +420,19 @@ class ConvNN(object):
         p_trainval = self.tpeaks[0:trainval_cutoff]
         t_trainval = self.training_ids[0:trainval_cutoff]
 
+        # ADDS THE CHANNEL DIMENSION ONCE INSTEAD OF RE-RESHAPING THE
+        # DATA INSIDE EVERY FOLD
+        x_trainval = x_trainval.reshape(x_trainval.shape[0],
+                                        x_trainval.shape[1], 1)
+
         kf = KFold(n_splits=n_splits, shuffle=shuffle)
 
+        # BUILDS AND COMPILES THE MODEL ONCE; EACH FOLD RESTARTS FROM
+        # THE SAME SEEDED INITIAL WEIGHTS INSTEAD OF REBUILDING AND
+        # RETRACING THE GRAPH K TIMES
+        self.create_model(seed)
+        init_weights = self.model.get_weights()
+
         if pred_test is True:
             pred_test_table = Table()
 
@@ -349,23 +446,35 @@ class ConvNN(object):
 
             p_val = p_trainval[vi]
             t_val = t_trainval[vi]
-            
-            # REFORMAT TO ADD ADDITIONAL CHANNEL TO DATA
-            x_train = x_train.reshape(x_train.shape[0], x_train.shape[1], 1)
-            x_val = x_val.reshape(x_val.shape[0], x_val.shape[1], 1)
-            
-            # CREATES MODEL AND RUNS ON REFOLDED TRAINING AND VALIDATION SETS
-            self.create_model(seed)
-            history = self.model.fit(x_train, y_train,
-                                     epochs=epochs,
-                                     batch_size=batch_size, shuffle=shuffle,
-                                     validation_data=(x_val, y_val))
+
+            # FEEDS EACH FOLD THROUGH A CACHED + PREFETCHED PIPELINE,
+            # AS IN TRAIN_MODELS
+            train_ds = tf.data.Dataset.from_tensor_slices((x_train, y_train))
+            train_ds = train_ds.cache()
+            if shuffle is True:
+                train_ds = train_ds.shuffle(len(y_train), seed=seed,
+                                            reshuffle_each_iteration=True)
+            train_ds = train_ds.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+            val_ds = tf.data.Dataset.from_tensor_slices((x_val, y_val))
+            val_ds = val_ds.cache().batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+            # RE-SEEDS THE FOLD, RESTORES THE SEEDED INITIAL WEIGHTS,
+            # AND RECOMPILES SO THE OPTIMIZER STATE FROM THE PREVIOUS
+            # FOLD IS DISCARDED -- EACH FOLD IS AN INDEPENDENT RUN
+            np.random.seed(seed)
+            tf.random.set_seed(seed)
+            self.model.set_weights(init_weights)
+            self._compile_model(self.model)
+            history = self.model.fit(train_ds, epochs=epochs,
+                                     validation_data=val_ds)
 
             # SAVES THE MODEL BY DEFAULT
             self.model.save(os.path.join(self.output_dir, 'crossval_s{0:04d}_i{1:04d}_b{2}_f{3:04d}.h5'.format(int(seed),
                                                                                                                int(epochs),
                                                                                                                self.frac_balance,
-                                                                                                               i)))
+                                                                                                               i)),
+                            include_optimizer=False)
             
 
             # CALCULATE METRICS FOR VALIDATION SET
@@ -410,17 +519,15 @@ class ConvNN(object):
         if save is True:
             fmt = 'crossval_{0}_s{1:04d}_i{2:04d}_b{3}.txt'
             predtab.write(os.path.join(self.output_dir, fmt.format('predval', int(seed),
-                                                                   int(epochs), self.frac_balance)), format='ascii',
-                          fast_writer=False)
+                                                                   int(epochs), self.frac_balance)), format='ascii')
             tab.write(os.path.join(self.output_dir, fmt.format('histories', int(seed),
-                                                               int(epochs), self.frac_balance)), format='ascii',
-                      fast_writer=False)
+                                                               int(epochs), self.frac_balance)), format='ascii')
 
             # SAVES TEST SET PREDICTIONS IF TRUE
             if pred_test is True:
                 pred_test_table.write(os.path.join(self.output_dir, fmt.format('predtest', int(seed),
                                                                                int(epochs), self.frac_balance)),
-                                      format='ascii', fast_writer=False)
+                                      format='ascii')
 
 
     def calibration(self, df, metric_threshold):
@@ -437,13 +544,12 @@ class ConvNN(object):
              a flares.
         """
         # ADD COLUMN TO TABLE THAT CALCULATES THE FRACTION OF MODELS
-        # THAT SAY SOMETHING IS A FLARE
-        names= [i for i in df.colnames if 's' in i]
-        flare_frac = np.zeros(len(df))
+        # THAT SAY SOMETHING IS A FLARE, BROADCAST OVER ALL PREDICTION
+        # COLUMNS AT ONCE
+        names = [i for i in df.colnames if 's' in i]
 
-        for i, val in enumerate(len(df)):
-            preds = np.array(list(df[names][i]))
-            flare_frac[i] = len(preds[preds >= threshold]) / len(preds)
+        preds = np.array([df[n].data for n in names])
+        flare_frac = np.sum(preds >= metric_threshold, axis=0) / len(names)
 
         df.add_column(Column(flare_frac, name='flare_frac'))
         
@@ -508,14 +614,16 @@ class ConvNN(object):
             med, std = np.nanmedian(diff), np.nanstd(diff)
             
             bad = np.where(np.abs(diff) >= med + 1.5*std)[0]
-            for b in bad:
-                bad_inds = np.append(bad_inds, np.arange(b-cad_pad,
-                                                         b+cad_pad,
-                                                         1, dtype=int))
+            if len(bad) > 0:
+                # MARKS ALL CADENCES AROUND EVERY GAP IN ONE
+                # BROADCAST INSTEAD OF APPENDING PER GAP
+                pad = np.arange(-int(cad_pad), int(cad_pad), 1, dtype=int)
+                bad_inds = np.append(bad_inds,
+                                     (bad[:, None] + pad).ravel())
             bad_inds = np.sort(bad_inds)
             return np.delete(all_inds, bad_inds)
 
-        model = keras.models.load_model(modelname)
+        model = keras.models.load_model(modelname, compile=False)
 
         self.model = model
 
@@ -534,38 +642,64 @@ class ConvNN(object):
 
         predictions = []
         pred_t, pred_f, pred_e = [], [], []
-    
-        for j in tqdm(range(len(times))):
+
+        # MASKS NANS OUT OF EVERY LIGHT CURVE FIRST, SO THE FULL MODEL
+        # INPUT CAN BE PREALLOCATED IN ONE GO
+        for j in range(len(times)):
             time = times[j] + 0.0
             lc   = fluxes[j] / np.nanmedian(fluxes[j]) # MUST BE NORMALIZED
             err  = errs[j] + 0.0
 
             q = ( (np.isnan(time) == False) & (np.isnan(lc) == False))
             time, lc, err = time[q], lc[q], err[q]
-            
+
             # APPENDS MASKED LIGHT CURVES TO KEEP TRACK OF
             pred_t.append(time)
             pred_f.append(lc)
             pred_e.append(err)
 
+        # PREALLOCATES THE MODEL INPUT FOR ALL LIGHT CURVES, FILLED
+        # IN-PLACE BELOW SO NOTHING IS COPIED OR CONCATENATED AFTER
+        total = int(np.sum([len(f) for f in pred_f]))
+        reshaped_data = np.empty((total, cadences, 1), dtype=np.float32)
+
+        start = 0
+        for j in tqdm(range(len(pred_f))):
+            time = pred_t[j]
+            lc   = pred_f[j]
+
             good_inds = identify_gaps(time)
-                
-            reshaped_data = np.zeros((len(lc), cadences))
 
-            for i in good_inds:
-                loc = [int(i-cad_pad), int(i+cad_pad)]
-                f = lc[loc[0]:loc[1]]
-                t = time[loc[0]:loc[1]]                    
-                reshaped_data[i] = f
-            
-            reshaped_data = reshaped_data.reshape(reshaped_data.shape[0], 
-                                                  reshaped_data.shape[1], 1)
-            
+            # BUILDS ALL CADENCE-LONG WINDOWS AT ONCE WITH A STRIDED
+            # VIEW RATHER THAN SLICING CADENCE-BY-CADENCE IN PYTHON;
+            # THE VIEW IS COPIED INTO THE OUTPUT ARRAY RIGHT AWAY
+            lc_padded = np.zeros(len(lc) + cadences, dtype=np.float32)
+            lc_padded[int(cad_pad):int(cad_pad)+len(lc)] = lc
+            stride, = lc_padded.strides
+            windows = np.lib.stride_tricks.as_strided(lc_padded,
+                                                      shape=(len(lc), cadences),
+                                                      strides=(stride, stride))
+            rows = reshaped_data[start:start+len(lc), :, 0]
+            rows[:] = windows
+
+            # ZEROES OUT CADENCES TOO CLOSE TO GAPS OR THE ENDS
+            mask = np.ones(len(lc), dtype=bool)
+            mask[good_inds] = False
+            rows[mask] = 0.0
+
+            start += len(lc)
+
+        # ONE PREDICT CALL OVER ALL LIGHT CURVES AVOIDS PER-CURVE
+        # GRAPH DISPATCH & KEEPS THE DEVICE FED WITH FULL BATCHES
+        preds = model.predict(reshaped_data)
+        preds = np.reshape(preds, (len(preds),))
+
+        # SPLITS THE PREDICTIONS BACK UP BY LIGHT CURVE
+        start = 0
+        for f in pred_f:
+            predictions.append(preds[start:start+len(f)])
+            start += len(f)
 
-            preds = model.predict(reshaped_data)
-            preds = np.reshape(preds, (len(preds),))
-            predictions.append(preds)
-            
         self.predict_time = np.array(pred_t)
         self.predict_flux = np.array(pred_f)
         self.predict_err  = np.array(pred_e)
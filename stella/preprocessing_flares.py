@@ -79,15 +79,17 @@ class FlareDataSet(object):
                           self.training_ids, self.training_peaks,
                           training, validation)
 
-        self.train_data   = misc[0]
+        # CASTS THE DATA TO CONTIGUOUS FLOAT32 ONCE, SO TENSORFLOW
+        # DOES NOT RE-CAST AND RE-COPY THE ARRAYS EVERY EPOCH
+        self.train_data   = np.ascontiguousarray(misc[0], dtype=np.float32)
         self.train_labels = misc[1]
 
-        self.val_data = misc[2]
+        self.val_data = np.ascontiguousarray(misc[2], dtype=np.float32)
         self.val_labels = misc[3]
         self.val_ids = misc[4]
         self.val_tpeaks = misc[5]
 
-        self.test_data = misc[6]
+        self.test_data = np.ascontiguousarray(misc[6], dtype=np.float32)
         self.test_labels = misc[7]
 
         self.test_ids = misc[8]
@@ -186,8 +188,8 @@ class FlareDataSet(object):
         x = 0
         
         for i in tqdm(range(len(self.time))):
-            flares = np.array([], dtype=int)
-            
+            flare_regions = []
+
             for peak in self.tpeaks[i]:
                 arg = np.where((self.time[i]>(peak-0.02)) & (self.time[i]<(peak+0.02)))[0]
                 # DOESN'T LIKE FLARES AT THE VERY END OF THE LIGHT CURVE 
@@ -203,7 +205,7 @@ class FlareDataSet(object):
                         start = start - (end - len(self.time[i]))
                         end = len(self.time[i])
                     flare_region = np.arange(start, end,1,dtype=int)
-                    flares = np.append(flares, flare_region)
+                    flare_regions.append(flare_region)
                 
                     # ADD FLARE TO TRAINING MATRIX & LABEL PROPERLY
                     training_peaks[x]  = self.time[i][closest] + 0.0
@@ -212,6 +214,13 @@ class FlareDataSet(object):
                     training_labels[x] = 1
                     x += 1
                 
+            # JOINS ALL FLARE REGIONS IN ONE CONCATENATE INSTEAD OF
+            # GROWING THE ARRAY ON EVERY FLARE
+            if len(flare_regions) > 0:
+                flares = np.concatenate(flare_regions)
+            else:
+                flares = np.array([], dtype=int)
+
             time_removed = np.delete(self.time[i], flares)
             flux_removed = np.delete(self.flux[i], flares)
             flux_err_removed = np.delete(self.flux_err[i], flares)
@@ -239,5 +248,5 @@ class FlareDataSet(object):
         self.labels = label
         self.training_peaks  = peaks
         self.training_ids    = ids
-        self.training_matrix = matrix
+        self.training_matrix = np.ascontiguousarray(matrix, dtype=np.float32)
         